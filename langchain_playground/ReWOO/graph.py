@@ -1,4 +1,11 @@
+import asyncio
+import hashlib
+import json
 import re
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
 from typing import List, Optional
 
 from dotenv import load_dotenv
@@ -6,11 +13,81 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, StateGraph
-from typing_extensions import TypedDict
+from pydantic import BaseModel, Field
+from typing_extensions import Literal, TypedDict
+
+from .semantic_cache import CachedLLM
 
 load_dotenv()
 
-planner_prompt = """
+# Tools whose results are safe to cache (read-only, no side effects).
+# Tools not listed here are always re-executed.
+CACHEABLE_TOOLS = {
+    "Google": 6 * 60 * 60,  # search results go stale within hours
+    "LLM": 7 * 24 * 60 * 60,  # general-knowledge answers are stable for days
+    "Summary": 30 * 24 * 60 * 60,  # pseudo-tool: summaries of oversized evidence, keyed by the evidence itself
+}
+
+
+class ToolCache:
+    """Disk-backed cache for tool execution results.
+
+    Repeated (tool, tool_input) pairs are frequent across ReWOO runs, and both
+    Tavily searches and LLM sub-calls are network-bound, so a hit replaces a
+    0.5-2s API round-trip with a local sqlite lookup. Entries expire per-tool
+    (see CACHEABLE_TOOLS) so search results do not go stale.
+    """
+
+    def __init__(self, db_path: str = ".cache/rewoo/tool_cache.sqlite"):
+        path = Path(db_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(tool: str, tool_input: str) -> str:
+        """Build a cache key from a tool name and its normalized input."""
+        normalized = " ".join(tool_input.lower().split())
+        return hashlib.blake2b(f"{tool}|{normalized}".encode()).hexdigest()
+
+    def get(self, tool: str, tool_input: str) -> Optional[str]:
+        if tool not in CACHEABLE_TOOLS:
+            return None
+        row = self.conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (self.make_key(tool, tool_input),)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, tool: str, tool_input: str, value: str) -> None:
+        if tool not in CACHEABLE_TOOLS:
+            return
+        expires_at = time.time() + CACHEABLE_TOOLS[tool]
+        self.conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (self.make_key(tool, tool_input), value, expires_at))
+        self.conn.commit()
+
+
+tool_cache = ToolCache()
+
+
+@lru_cache(maxsize=1)
+def _search_tool() -> TavilySearchResults:
+    """Shared Tavily search tool.
+
+    Three basic-depth results instead of the default five keep the evidence
+    (and therefore the solver prompt) small, and include_answer gives the
+    solver a concise summary up front. One instance is shared across graphs
+    so its underlying HTTP session is reused.
+    """
+    return TavilySearchResults(max_results=3, search_depth="basic", include_answer=True)
+
+
+# The static instructions live in the system message and the tiny dynamic part
+# ({task}/{plan}) in the user message, so OpenAI's automatic prefix caching
+# can reuse the cached KV state of the leading prefix. Only the static prefix
+# is cacheable: the solver's {plan} holds tool results and must stay out of
+# the cached block.
+planner_system = """
 For the following task, make plans that can solve the problem step by step. For each plan, indicate which external tool together with tool input to retrieve evidence. You can store the evidence into a variable #E that can be called by later tools. (Plan, #E1, Plan, #E2, Plan, ...)
 
 Tools can be one of the following:
@@ -23,30 +100,52 @@ Plan: Given Thomas worked x hours, translate the problem into algebraic expressi
 Plan: Find out the number of hours Thomas worked. #E2 = LLM[What is x, given #E1]
 Plan: Calculate the number of hours Rebecca worked. #E3 = Calculator[(2 ∗ #E2 − 10) − 8]
 
-Begin! 
+Begin!
 Describe your plans with rich details. Each Plan should be followed by only one #E.
-
-Task: {task}
 """
 
-solver_prompt = """
-Solve the following task or problem. To solve the problem, we have made step-by-step Plan and retrieved corresponding Evidence to each Plan. Use them with caution since long evidence might contain irrelevant information.
+planner_user = "Task: {task}"
 
-Plan: {plan}
+planner_template = ChatPromptTemplate.from_messages([("system", planner_system), ("user", planner_user)])
+
+solver_system = """
+Solve the following task or problem. To solve the problem, we have made step-by-step Plan and retrieved corresponding Evidence to each Plan. Use them with caution since long evidence might contain irrelevant information. Respond with the answer directly with no extra words.
+"""
 
-Now solve the question or task according to provided Evidence above. Respond with the answer directly with no extra words.
+solver_user = """
+Plan: {plan}
 
 Task: {task}
 Response:
 """
 
+solver_template = ChatPromptTemplate.from_messages([("system", solver_system), ("user", solver_user)])
+
+# Evidence references (#E1, #E2, ...) inside a tool input.
+_EREF = re.compile(r"#E\d+")
+
+
+class Step(BaseModel):
+    """A single step of the planner's output."""
+
+    plan: str = Field(description="Reasoning for this step")
+    name: str = Field(description="Evidence tag for this step's result, e.g. #E1")
+    tool: Literal["Google", "LLM"] = Field(description="Tool to execute")
+    input: str = Field(description="Tool input; may reference earlier evidence tags such as #E1")
+
+
+class Plan(BaseModel):
+    """Full plan emitted by the planner as structured output."""
+
+    steps: List[Step]
+
 
 class ReWOO(TypedDict):
     """State dictionary for the ReWOO graph execution.
 
     Attributes:
         task (str): The input task or question to be solved
-        plan_string (str): Raw string output from the planner containing the full plan
+        plan_string (str): The full plan serialized as JSON (Plan.model_dump_json())
         steps (List): List of parsed plan steps, each containing plan text, evidence tag, tool name and input
         results (dict): Dictionary mapping evidence tags to tool execution results
         result (str): Final answer or solution to the task
@@ -60,20 +159,28 @@ class ReWOO(TypedDict):
 
 
 class ReWOOGraph:
+    # Evidence longer than this is summarized before entering the solver prompt
+    EVIDENCE_CHAR_LIMIT = 4000
+
     def __init__(self, model_name: str = "gpt-4o-mini"):
+        # The semantic cache only fronts the planner and solver prompts, where
+        # paraphrases are safe to fold together. Tool sub-calls and evidence
+        # summaries use the raw model: short factual inputs ("capital of
+        # Slovakia" vs "capital of Slovenia") can clear the similarity
+        # threshold with a wrong answer, and exact repeats already hit the
+        # tool cache.
         self.llm = ChatOpenAI(model=model_name)
-        self.search = TavilySearchResults()
+        self.cached_llm = CachedLLM(self.llm, threshold=0.95)
+        self.search = _search_tool()
 
     def plan(self, state: ReWOO) -> dict:
         """Generate an execution plan for solving the given task.
 
-        Takes a ReWOO state dictionary and generates a structured plan by:
-        1. Prompting an LLM with the task to generate plan steps
-        2. Parsing the plan steps using regex to extract:
-           - Plan description
-           - Evidence tag (#E1, #E2, etc)
-           - Tool name (Google, LLM, etc)
-           - Tool input
+        The planner emits the plan as structured output against the Plan
+        schema, so each step arrives typed (plan text, evidence tag, tool,
+        input) with no regex scraping and no retry-on-parse-failure. Plans are
+        still served from the semantic cache when a near-identical task was
+        already planned.
 
         Args:
             state (ReWOO): State dictionary containing the task
@@ -81,46 +188,125 @@ class ReWOOGraph:
         Returns:
             dict: Dictionary containing:
                 - steps: List of tuples with (plan, evidence_tag, tool, input) for each step
-                - plan_string: Raw plan output from the LLM
+                - plan_string: The plan serialized as JSON
         """
-        prompt = ChatPromptTemplate.from_messages([("user", planner_prompt)])
-        planner = prompt | self.llm
-
         task = state["task"]
-        result = planner.invoke({"task": task})
+        messages = planner_template.format_messages(task=task)
+
+        # Key the cache by the task alone: embedding the full prompt would let
+        # the shared instruction prefix dominate the similarity and make
+        # unrelated tasks look near-identical.
+        cached = self.cached_llm.cache.lookup(task)
+        plan = None
+        if cached is not None:
+            try:
+                plan = Plan.model_validate_json(cached)
+            except ValueError:  # stale entry from the free-text plan format
+                plan = None
+        if plan is None:
+            plan = self.llm.with_structured_output(Plan).invoke(messages)
+            self.cached_llm.cache.store(task, plan.model_dump_json())
+
+        steps = [(step.plan, step.name, step.tool, step.input) for step in plan.steps]
+        return {"steps": steps, "plan_string": plan.model_dump_json()}
+
+    async def _trim_evidence(self, result_str: str) -> str:
+        """Cap oversized tool evidence before it reaches the solver prompt.
+
+        Raw search snippets or full subtitles can balloon the solver prompt to
+        tens of thousands of tokens; evidence over EVIDENCE_CHAR_LIMIT is
+        replaced by a one-shot summary, cached by the evidence text so the
+        same content is never summarized twice.
+        """
+        if len(result_str) <= self.EVIDENCE_CHAR_LIMIT:
+            return result_str
 
-        regex_pattern = r"Plan:\s*(.+)\s*(#E\d+)\s*=\s*(\w+)\s*\[([^\]]+)\]"
-        matches = re.findall(regex_pattern, result.content)
+        cached = tool_cache.get("Summary", result_str)
+        if cached is not None:
+            return cached
 
-        return {"steps": matches, "plan_string": result.content}
+        summary = await self.llm.ainvoke(f"Summarize the following to at most 500 tokens, preserving all facts, names, numbers and dates:\n{result_str}")
+        tool_cache.set("Summary", result_str, summary.content)
+        return summary.content
 
-    def _get_current_task(self, state: ReWOO) -> Optional[int]:
-        """Get the index of the next task to execute in the plan.
+    async def _run_one(self, step: tuple, results: dict) -> str:
+        """Execute a single plan step and return its result string.
 
-        Args:
-            state (ReWOO): Current state containing results and plan steps
+        Substitutes previously gathered evidence into the tool input, checks
+        the persistent tool cache, then dispatches to the async search or LLM
+        client on a miss.
+        """
+        _, step_name, tool, tool_input = step
+        tool_input = _EREF.sub(lambda m: results.get(m.group(0), m.group(0)), tool_input)
+
+        cached = tool_cache.get(tool, tool_input)
+        if cached is not None:
+            return cached
+
+        if tool == "Google":
+            result_str = str(await self.search.ainvoke(tool_input))
+        else:
+            # Default to LLM for unknown tools
+            result_str = (await self.llm.ainvoke(tool_input)).content
+
+        result_str = await self._trim_evidence(result_str)
+        tool_cache.set(tool, tool_input, result_str)
+        return result_str
+
+    async def _run_llm_batch(self, steps: List[tuple], results: dict) -> dict:
+        """Answer several independent LLM steps in a single request.
+
+        Each LLM step otherwise costs its own HTTP round-trip (~300-800ms of
+        network latency); fusing them into one JSON-mode call returns a
+        {step_name: answer} mapping in a single round-trip. Steps already in
+        the tool cache are answered locally and excluded from the request.
 
         Returns:
-            Optional[int]: Index of next task (1-based), or None if all tasks are complete
-                          Returns 1 if no results exist yet
-                          Returns None if all steps have results
-                          Otherwise returns next step number (len of results + 1)
+            dict: Mapping of step names to their answer strings
         """
-        if "results" not in state or state["results"] is None:
-            return 1
-        if len(state["results"]) == len(state["steps"]):
-            return None
-        return len(state["results"]) + 1
-
-    def tool_execution(self, state: ReWOO) -> dict:
-        """Execute the next tool in the plan based on the current state.
+        outputs = {}
+        pending = []
+        for _, step_name, _, tool_input in steps:
+            tool_input = _EREF.sub(lambda m: results.get(m.group(0), m.group(0)), tool_input)
+            cached = tool_cache.get("LLM", tool_input)
+            if cached is not None:
+                outputs[step_name] = cached
+            else:
+                pending.append((step_name, tool_input))
+
+        if len(pending) == 1:
+            step_name, tool_input = pending[0]
+            answer = (await self.llm.ainvoke(tool_input)).content
+            tool_cache.set("LLM", tool_input, answer)
+            outputs[step_name] = answer
+            return outputs
+
+        if pending:
+            items = "\n\n".join(f"{step_name}: {tool_input}" for step_name, tool_input in pending)
+            prompt = 'Answer each of the following items independently. Return a JSON object mapping each item key (e.g. "#E1") to its answer string.\n\n' + items
+            result = await self.llm.bind(response_format={"type": "json_object"}).ainvoke(prompt)
+            try:
+                answers = json.loads(result.content)
+            except json.JSONDecodeError:
+                answers = {}
+            for step_name, tool_input in pending:
+                if step_name in answers:
+                    answer = str(answers[step_name])
+                else:
+                    # Fall back to a direct call for anything the batch missed
+                    answer = (await self.llm.ainvoke(tool_input)).content
+                tool_cache.set("LLM", tool_input, answer)
+                outputs[step_name] = answer
+        return outputs
+
+    async def tool_execution(self, state: ReWOO) -> dict:
+        """Execute all currently runnable plan steps concurrently.
 
         This worker node:
-        1. Gets the next task to execute from the plan
-        2. Extracts the tool name and input parameters
-        3. Replaces any references to previous results in the input
-        4. Executes either the Google search or LLM tool
-        5. Stores the result under the step's evidence tag
+        1. Builds the frontier: steps whose #E dependencies are all satisfied
+        2. Fires the frontier's tool calls concurrently with asyncio.gather
+           (the work is network-bound, so independent steps overlap fully)
+        3. Stores each result under its step's evidence tag
 
         Args:
             state (ReWOO): Current state containing:
@@ -128,31 +314,33 @@ class ReWOOGraph:
                 - results: Dict of previous results
 
         Returns:
-            dict: Updated results dictionary with new tool output added
-
-        Raises:
-            ValueError: If an unknown tool type is specified
+            dict: Updated results dictionary with the new tool outputs added
         """
-        step_num = self._get_current_task(state)
-
-        if not state.get("steps") or step_num is None or step_num < 1 or step_num > len(state["steps"]):
-            return {"results": {}}
-
-        _, step_name, tool, tool_input = state["steps"][step_num - 1]
-
+        steps = state.get("steps") or []
         results = (state["results"] or {}) if "results" in state else {}
-        for k, v in results.items():
-            tool_input = tool_input.replace(k, v)
-
-        if tool == "Google":
-            result = self.search.invoke(tool_input)
-        elif tool == "LLM":
-            result = self.llm.invoke(tool_input)
-        else:
-            # Default to LLM if unknown tool
-            result = self.llm.invoke(tool_input)
 
-        results[step_name] = str(result)
+        step_names = {step[1] for step in steps}
+        pending = [step for step in steps if step[1] not in results]
+        frontier = [step for step in pending if set(_EREF.findall(step[3])) & step_names <= results.keys()]
+        if not frontier and pending:
+            # Malformed plans (circular or dangling #E references) would
+            # otherwise never progress; fall back to plan order.
+            frontier = pending[:1]
+        if not frontier:
+            return {"results": results}
+
+        llm_frontier = [step for step in frontier if step[2] == "LLM"]
+        if len(llm_frontier) >= 2:
+            others = [step for step in frontier if step[2] != "LLM"]
+            *other_outputs, llm_outputs = await asyncio.gather(*(self._run_one(step, results) for step in others), self._run_llm_batch(llm_frontier, results))
+            for step, output in zip(others, other_outputs):
+                results[step[1]] = output
+            results.update(llm_outputs)
+            return {"results": results}
+
+        outputs = await asyncio.gather(*(self._run_one(step, results) for step in frontier))
+        for step, output in zip(frontier, outputs):
+            results[step[1]] = output
         return {"results": results}
 
     def solve(self, state: ReWOO) -> dict:
@@ -172,22 +360,25 @@ class ReWOOGraph:
         Returns:
             dict: Contains single key "result" mapping to LLM's final answer
         """
+        results = (state["results"] or {}) if "results" in state else {}
+
+        def substitute(text: str) -> str:
+            return _EREF.sub(lambda m: results.get(m.group(0), m.group(0)), text)
+
         plan_steps = []
         for _plan, step_name, tool, tool_input in state["steps"]:
-            results = (state["results"] or {}) if "results" in state else {}
-            for k, v in results.items():
-                tool_input = tool_input.replace(k, v)
-                step_name = step_name.replace(k, v)
-            plan_steps.append(f"Plan: {_plan}\n{step_name} = {tool}[{tool_input}]")
+            plan_steps.append(f"Plan: {_plan}\n{substitute(step_name)} = {tool}[{substitute(tool_input)}]")
 
         plan = "\n".join(plan_steps)
-        prompt = solver_prompt.format(plan=plan, task=state["task"])
-        result = self.llm.invoke(prompt)
+        result = self.cached_llm.invoke(
+            solver_template.format_messages(plan=plan, task=state["task"]),
+            cache_key_text=f"{state['task']}\n{plan}",  # dynamic content only, see plan()
+        )
         return {"result": result.content}
 
     def _route(self, state: ReWOO) -> str:
-        step_num = self._get_current_task(state)
-        if step_num is None:
+        results = state.get("results") or {}
+        if len(results) == len(state["steps"]):
             return "solve"
         return "tool"
 
@@ -208,7 +399,19 @@ class ReWOOGraph:
         return graph.compile()
 
 
+@lru_cache(maxsize=4)
+def get_app(model_name: str = "gpt-4o-mini"):
+    """Compiled ReWOO app, built once per process per model.
+
+    Building the app constructs the LLM client, opens the cache databases and
+    compiles the graph, so rebuilding it per call is pure overhead. The
+    compiled graph holds live API clients and sqlite connections and therefore
+    cannot be pickled and reloaded across processes; memoizing per process
+    captures the rebuild cost, and each worker pays the build exactly once.
+    """
+    return ReWOOGraph(model_name).create_graph()
+
+
 def rewoo(task: str) -> str:
-    graph = ReWOOGraph().create_graph()
-    response = graph.invoke({"task": task})
+    response = asyncio.run(get_app().ainvoke({"task": task}))
     return response["result"]
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Union
+
+import faiss
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_openai import OpenAIEmbeddings
+
+
+class Embedder:
+    """Shared embedding client with a per-process LRU over input strings.
+
+    Anything that embeds prompts (the semantic cache today, retrieval tools
+    later) should go through this facade so the process holds one embedding
+    client and identical strings are embedded at most once. Vectors are
+    returned L2-normalized, ready for cosine/inner-product search.
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small", lru_size: int = 4096):
+        self.embeddings = OpenAIEmbeddings(model=model)
+        self._embed_cached = lru_cache(maxsize=lru_size)(self._embed_uncached)
+
+    def _embed_uncached(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self._embed_cached(text)
+
+
+@lru_cache(maxsize=1)
+def get_embedder() -> Embedder:
+    return Embedder()
+
+
+class SemanticCache:
+    """Embedding-based cache for LLM responses.
+
+    Paraphrased tasks ("hometown of the 2024 AO winner" vs "where is the 2024
+    AO champion from") produce near-identical prompts that would each pay a
+    full API round-trip. Prompts are embedded with text-embedding-3-small and
+    matched against previous prompts with a FAISS inner-product search over
+    normalized vectors; a cosine similarity at or above `threshold` returns
+    the stored response instead of calling the model.
+
+    Entries persist in sqlite (vectors included) so the cache survives
+    restarts; the FAISS index is rebuilt from sqlite at load. When the cache
+    exceeds `max_entries`, the least recently used entries are evicted.
+    """
+
+    EMBEDDING_DIM = 1536
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024, db_path: str = ".cache/rewoo/semantic_cache.sqlite"):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        path = Path(db_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY AUTOINCREMENT, prompt_hash TEXT UNIQUE, response TEXT, vector BLOB, last_used REAL)")
+        self.conn.commit()
+        # lookup/store run in worker threads from ainvoke; one sqlite
+        # connection must not be used concurrently
+        self._lock = threading.Lock()
+        self.embedder = get_embedder()
+        self.index = faiss.IndexFlatIP(self.EMBEDDING_DIM)
+        self._ids: List[int] = []
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        """Reload the FAISS index from the persisted vectors."""
+        self.index.reset()
+        self._ids = []
+        rows = self.conn.execute("SELECT id, vector FROM entries ORDER BY id").fetchall()
+        if rows:
+            vectors = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            self.index.add(vectors)
+            self._ids = [row[0] for row in rows]
+
+    def _embed(self, text: str) -> np.ndarray:
+        return self.embedder.embed(text)
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.blake2b(text.encode()).hexdigest()
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Return the cached response for a semantically equivalent prompt, or None."""
+        with self._lock:
+            # Exact-match fast path: skip the embedding call for verbatim repeats.
+            row = self.conn.execute("SELECT id, response FROM entries WHERE prompt_hash = ?", (self._hash(text),)).fetchone()
+            if row is None and self.index.ntotal > 0:
+                vector = self._embed(text)
+                similarities, indices = self.index.search(vector.reshape(1, -1), 1)
+                if similarities[0][0] >= self.threshold:
+                    entry_id = self._ids[indices[0][0]]
+                    row = self.conn.execute("SELECT id, response FROM entries WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET last_used = julianday('now') WHERE id = ?", (row[0],))
+            self.conn.commit()
+            return row[1]
+
+    def store(self, text: str, response: str) -> None:
+        """Persist a prompt/response pair and add its vector to the index."""
+        with self._lock:
+            vector = self._embed(text)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (prompt_hash, response, vector, last_used) VALUES (?, ?, ?, julianday('now'))",
+                (self._hash(text), response, vector.tobytes()),
+            )
+            count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute("DELETE FROM entries WHERE id IN (SELECT id FROM entries ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+            self.conn.commit()
+            self._rebuild_index()
+
+
+class CachedLLM:
+    """Drop-in wrapper that short-circuits an LLM call on a semantic cache hit.
+
+    Wraps a chat model's `invoke`; unknown attributes are delegated to the
+    wrapped model so call sites keep working unchanged. For templated prompts,
+    pass `cache_key_text` with just the dynamic content (e.g. the task) —
+    embedding the full prompt would let a large shared instruction prefix
+    dominate the similarity and make unrelated prompts look near-identical.
+    """
+
+    def __init__(self, llm, threshold: float = 0.95, max_entries: int = 1024):
+        self.llm = llm
+        self.cache = SemanticCache(threshold=threshold, max_entries=max_entries)
+
+    @staticmethod
+    def _to_text(input: Union[str, List[BaseMessage]]) -> str:
+        if isinstance(input, str):
+            return input
+        return "\n".join(str(message.content) for message in input)
+
+    def invoke(self, input: Union[str, List[BaseMessage]], cache_key_text: Optional[str] = None) -> AIMessage:
+        text = cache_key_text if cache_key_text is not None else self._to_text(input)
+        cached = self.cache.lookup(text)
+        if cached is not None:
+            return AIMessage(content=cached)
+        result = self.llm.invoke(input)
+        self.cache.store(text, result.content)
+        return result
+
+    async def ainvoke(self, input: Union[str, List[BaseMessage]], cache_key_text: Optional[str] = None) -> AIMessage:
+        text = cache_key_text if cache_key_text is not None else self._to_text(input)
+        # lookup/store embed and hit sqlite synchronously; run them in a
+        # worker thread so cache misses don't block the event loop
+        cached = await asyncio.to_thread(self.cache.lookup, text)
+        if cached is not None:
+            return AIMessage(content=cached)
+        result = await self.llm.ainvoke(input)
+        await asyncio.to_thread(self.cache.store, text, result.content)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
@@ -1,19 +1,166 @@
+import asyncio
+import functools
 import os
 import re
+from pathlib import Path
 from typing import Generator, Iterator, List, Union
 
-import opencc
+import httpx
 from langchain.chat_models import init_chat_model
 from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.runnables import RunnableWithMessageHistory
+from langchain_core.messages import AIMessageChunk, HumanMessage
 from langchain_core.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
 from langgraph.prebuilt import create_react_agent
-from pytubefix import YouTube
 
-from .YouTubeLoader import url_to_subtitles
+# Provider clients (langchain_google_genai, AzureChatOpenAI), pytubefix, opencc
+# and the YouTubeLoader pipeline (torch/transformers) are imported lazily in
+# the branches that need them - they dominate cold-start time and are wasted
+# for a single-provider user.
+
+_MULTINL = re.compile(r"\n{3,}")
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_http_client() -> httpx.Client:
+    """One keep-alive connection pool shared by every OpenAI-compatible client."""
+    return httpx.Client(limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=30))
+
+
+@functools.lru_cache(maxsize=16)
+def _get_llm(model_id: str):
+    """Build (or reuse) the chat model for a model id.
+
+    Memoized so every UniversalChain hitting the same endpoint shares one
+    client and its connection pool instead of redoing TLS setup per instance.
+    """
+    try:
+        if "azure" in model_id:
+            from langchain_openai import AzureChatOpenAI
+
+            llm = AzureChatOpenAI(
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+                api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+                http_client=_shared_http_client(),
+            )
+        elif "gemini" in model_id:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            llm = ChatGoogleGenerativeAI(model=model_id, api_key=os.getenv("GEMINI_API_KEY"))
+        elif "claude" in model_id:
+            from langchain_openai import ChatOpenAI
+
+            llm = ChatOpenAI(
+                model=f"anthropic/{model_id}",  # Avoid making model_id with '/', otherwise it will mess up the FastAPI URL
+                base_url="https://openrouter.ai/api/v1",
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                http_client=_shared_http_client(),
+            )
+        elif "gpt" in model_id:
+            from langchain_openai import ChatOpenAI
+
+            llm = ChatOpenAI(model=model_id, api_key=os.getenv("OPENAI_API_KEY"), http_client=_shared_http_client())
+        else:
+            llm = init_chat_model(model=model_id)
+    except Exception as e:
+        raise ValueError(f"Invalid model_id: {model_id}\n{e}")
+    return llm
+
+
+@functools.lru_cache(maxsize=1)
+def _s2hk_converter() -> "opencc.OpenCC":
+    # The OpenCC constructor parses a multi-MB dictionary; load it once per process
+    import opencc
+
+    return opencc.OpenCC("s2hk")
+
+
+@tool
+def webloader(urls: Union[str, List[str]]) -> str:
+    """Load the content of one or more websites from their urls to text."""
+    if isinstance(urls, str):
+        urls = [urls]
+    loader = WebBaseLoader(urls, continue_on_failure=True)
+    # aload fetches all urls concurrently with aiohttp instead of one blocking
+    # HTTP request per url
+    docs = loader.aload()
+    if asyncio.iscoroutine(docs):  # aload is async in newer langchain-community
+        docs = asyncio.run(docs)
+    # Join first, then normalize newlines in one pass over the full buffer
+    joined = "\n\n".join(doc.page_content for doc in docs)
+    return f"Website: {', '.join(urls)}" + _MULTINL.sub("\n\n", joined)
+
+
+# Video id in the known YouTube url forms (watch, youtu.be, shorts, embed)
+_YT_ID_RE = re.compile(r"(?:v=|youtu\.be/|/shorts/|/embed/)([A-Za-z0-9_-]{11})")
+
+
+# In-memory payload cache. Deliberately not lru_cache: only successful
+# payloads are stored, so a transient pytubefix/network failure is retried on
+# the next call instead of being sticky for the rest of the process. Payloads
+# carry full subtitles, so the cache is bounded; evicted videos fall back to
+# the on-disk copy.
+_YT_PAYLOAD_CACHE_SIZE = 512
+_youtube_payloads = {}
+
+
+def _remember_youtube_payload(video_id: str, payload: str) -> None:
+    if len(_youtube_payloads) >= _YT_PAYLOAD_CACHE_SIZE:
+        # Dicts keep insertion order; drop the oldest entry
+        _youtube_payloads.pop(next(iter(_youtube_payloads)))
+    _youtube_payloads[video_id] = payload
+
+
+def _youtube_payload(video_id: str) -> str:
+    """Build the youtube_loader payload for a video, cached by video id.
+
+    Title, author and subtitles are immutable for practical purposes, so
+    successful payloads are kept in memory per process and persisted next to
+    the subtitle cache; a hit skips both pytubefix metadata round-trips and
+    the whole subtitle pipeline. Error payloads are returned but never cached.
+    """
+    cached = _youtube_payloads.get(video_id)
+    if cached is not None:
+        return cached
+
+    payload_path = Path(f".cache/{video_id}/payload.txt")
+    if payload_path.exists():
+        payload = payload_path.read_text(encoding="utf-8")
+        _remember_youtube_payload(video_id, payload)
+        return payload
+
+    from pytubefix import YouTube
+
+    from .YouTubeLoader import url_to_subtitles
+
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    yt = YouTube(url)
+    subtitles = url_to_subtitles(url)
+    payload = f"Answer the user's question based on the full content.\nTitle: {yt.title}\nAuthor: {yt.author}\nSubtitles:\n\n{subtitles}"
+    if not subtitles.startswith("Error processing video"):
+        _remember_youtube_payload(video_id, payload)
+        payload_path.parent.mkdir(parents=True, exist_ok=True)
+        payload_path.write_text(payload, encoding="utf-8")
+    return payload
+
+
+@tool
+def youtube_loader(url: str) -> str:
+    # https://github.com/JuanBindez/pytubefix/blob/main/pytubefix/__main__.py
+    """Load the subtitles of a YouTube video by url in form such as: https://www.youtube.com/watch?v=..., https://youtu.be/..., or more."""
+    match = _YT_ID_RE.search(url)
+    if match:
+        return _youtube_payload(match.group(1))
+
+    from pytubefix import YouTube
+
+    from .YouTubeLoader import url_to_subtitles
+
+    # Unrecognized url form: let pytubefix resolve it without caching
+    yt = YouTube(url)
+    return f"Answer the user's question based on the full content.\nTitle: {yt.title}\nAuthor: {yt.author}\nSubtitles:\n\n{url_to_subtitles(url)}"
 
 
 class UniversalChain:
@@ -25,71 +172,41 @@ class UniversalChain:
         self.chain = self.create_chain()
 
     def get_llm(self, model_id: str):
-        try:
-            if "azure" in model_id:
-                llm = AzureChatOpenAI(
-                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-                    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-                    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-                )
-            elif "gemini" in model_id:
-                llm = ChatGoogleGenerativeAI(model=model_id, api_key=os.getenv("GEMINI_API_KEY"))
-            elif "claude" in model_id:
-                llm = ChatOpenAI(
-                    model=f"anthropic/{model_id}",  # Avoid making model_id with '/', otherwise it will mess up the FastAPI URL
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=os.getenv("OPENROUTER_API_KEY"),
-                )
-            elif "gpt" in model_id:
-                llm = ChatOpenAI(model=model_id, api_key=os.getenv("OPENAI_API_KEY"))
-            else:
-                llm = init_chat_model(model=model_id)
-        except Exception as e:
-            raise ValueError(f"Invalid model_id: {model_id}\n{e}")
-        return llm
+        return _get_llm(model_id)
 
     def get_tools(self):
-
-        @tool
-        def webloader(url: str) -> str:
-            """Load the content of a website from url to text."""
-            docs = WebBaseLoader(url).load()
-            docs = [re.sub(r"\n{3,}", r"\n\n", doc.page_content) for doc in docs]
-            docs_string = f"Website: {url}" + "\n\n".join(docs)
-            return docs_string
-
-        @tool
-        def youtube_loader(url: str) -> str:
-            # https://github.com/JuanBindez/pytubefix/blob/main/pytubefix/__main__.py
-            """Load the subtitles of a YouTube video by url in form such as: https://www.youtube.com/watch?v=..., https://youtu.be/..., or more."""
-            yt = YouTube(url)
-            return f"Answer the user's question based on the full content.\nTitle: {yt.title}\nAuthor: {yt.author}\nSubtitles:\n\n{url_to_subtitles(url)}"
-
         return [webloader, youtube_loader]
 
     def create_chain(self):
-        agent = create_react_agent(self.llm, self.tools)
-
+        # History is threaded through generate_response rather than
+        # RunnableWithMessageHistory: the wrapper turns the graph into a
+        # sequence that cannot forward stream_mode to it, which breaks token
+        # streaming whenever use_history=True.
+        return create_react_agent(self.llm, self.tools)
+
+    def generate_response(self, input_text: str) -> Iterator[str]:
+        """Stream the response tokens as they are generated.
+
+        Streaming makes the first token available after time-to-first-token
+        instead of the full trajectory latency, and avoids buffering the whole
+        message list before returning anything. With history enabled, prior
+        messages are prepended to the input and the finished exchange is
+        recorded once the stream ends.
+        """
+        messages = list(self.history.messages) if self.use_history else []
+        messages.append(HumanMessage(content=input_text))
+        tokens = []
+        for chunk, _ in self.chain.stream({"messages": messages}, stream_mode="messages"):
+            if isinstance(chunk, AIMessageChunk) and chunk.content:
+                tokens.append(chunk.content)
+                yield chunk.content
         if self.use_history:
-            return RunnableWithMessageHistory(
-                agent,
-                # This is needed because in most real world scenarios, a session id is needed
-                # It isn't really used here because we are using a simple in memory ChatMessageHistory
-                lambda session_id: self.history,
-                input_messages_key="messages",
-                history_messages_key="chat_history",
-            )
-
-        return agent
-
-    def generate_response(self, input_text: str):
-        config = {"configurable": {"session_id": "universal-chain-session"}}
-        return self.chain.invoke({"messages": [("user", input_text)]}, config)["messages"][-1].content
+            self.history.add_user_message(input_text)
+            self.history.add_ai_message("".join(tokens))
 
+    @staticmethod
     def s2hk(content: str) -> str:
-        converter = opencc.OpenCC("s2hk")
-        return converter.convert(content)
+        return _s2hk_converter().convert(content)
 
 
 if __name__ == "__main__":
@@ -99,5 +216,7 @@ Explain convex problem and how to solve it.
 """
     print(f"Question:\n{question}")
     print()
-    print(f"Response:\n{chain.generate_response(question)}")
+    print("Response:")
+    for token in chain.generate_response(question):
+        print(token, end="", flush=True)
     print()
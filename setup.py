@@ -43,6 +43,8 @@ setup(
         "langchain-community",
         "langchain-openai",
         "langchain-together",
+        # Semantic cache
+        "faiss-cpu",
         # UI and Interface
         "gradio",
         # YouTubeLoader dependencies